@@ -1,84 +1,128 @@
 #!/usr/bin/env python3
 """
 Script to fetch all available models from OpenRouter API and save to models.json.
-Uses curl subprocess for the API request.
+Uses httpx for the API request.
 """
 import json
 import os
-import subprocess
+import time
+import httpx
+import orjson
 from dotenv import load_dotenv
 
+try:
+    import numpy as np
+except ImportError:
+    # Optional: the price sort falls back to pure Python
+    np = None
+
+# Load environment variables from .env file once at import time
+load_dotenv()
+
+# API key cached at module level; checked again at request time so a
+# missing key gives a clear error rather than a 401
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
+
+# Local cache for the /models response; the catalog changes at most daily,
+# so skip the HTTP round-trip when the cached copy is fresh enough.
+CACHE_FILE = ".models_cache.json"
+CACHE_TTL_SECONDS = 3600  # 1 hour
+
 
 def get_openrouter_models():
     """
-    Fetch all available models from OpenRouter API using curl.
-    
+    Fetch all available models from OpenRouter API.
+
+    Uses a local file cache (.models_cache.json) so repeated runs within
+    the TTL don't hit the network at all.
+
     Returns:
         dict: The parsed JSON response containing model information
     """
-    # Load API key from environment variables
-    load_dotenv()
-    api_key = os.environ.get("OPENROUTER_API_KEY")
-    
-    if not api_key:
+    # Return the cached response if it is still fresh
+    try:
+        cache_age = time.time() - os.stat(CACHE_FILE).st_mtime
+        if cache_age < CACHE_TTL_SECONDS:
+            with open(CACHE_FILE, 'rb') as f:
+                return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        # Missing or corrupt cache: fall through to a fresh fetch
+        pass
+
+    if not OPENROUTER_API_KEY:
         raise ValueError("OPENROUTER_API_KEY environment variable not found")
-    
-    # Build the curl command
-    curl_command = [
-        "curl",
-        "-s",  # Silent mode
-        "-X", "GET",
-        "https://openrouter.ai/api/v1/models",
-        "-H", f"Authorization: Bearer {api_key}",
-        "-H", "Content-Type: application/json"
-    ]
-    
-    # Execute the curl command
+
+    # Request the model list directly (no subprocess/curl overhead)
     try:
-        result = subprocess.run(
-            curl_command,
-            capture_output=True,
-            text=True,
-            check=True
+        response = httpx.get(
+            "https://openrouter.ai/api/v1/models",
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            timeout=30
         )
-        return json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing curl command: {e}")
-        print(f"Output: {e.stdout}")
-        print(f"Error: {e.stderr}")
+        response.raise_for_status()
+        models_data = orjson.loads(response.content)
+
+        # Cache the response atomically (write to tmp, then rename)
+        tmp_file = CACHE_FILE + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(models_data))
+        os.replace(tmp_file, CACHE_FILE)
+
+        return models_data
+    except httpx.HTTPStatusError as e:
+        print(f"Error fetching models: {e}")
+        print(f"Response: {e.response.text}")
         raise
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}")
-        print(f"Response: {result.stdout}")
+        print(f"Response: {response.text}")
         raise
 
 
-def save_models_to_json(models_data, filename="models.json"):
+# Importable alias for the canonical fetch entry point
+fetch_models = get_openrouter_models
+
+
+def get_total_price(model):
+    """
+    Calculate the total price (prompt + completion) for a model.
+
+    Args:
+        model (dict): A single model entry from the API response
+
+    Returns:
+        float: The combined prompt and completion price
+    """
+    pricing = model.get('pricing', {})
+    prompt_price = float(pricing.get('prompt', 0))
+    completion_price = float(pricing.get('completion', 0))
+    return prompt_price + completion_price
+
+
+def save_models_to_json(models_data, filename="models.json", sort_by_price=True):
     """
     Save the models data to a JSON file, sorted by price from most expensive to least expensive.
-    
+
     Args:
         models_data (dict): The models data from OpenRouter API
         filename (str, optional): The filename to save to. Defaults to "models.json".
+        sort_by_price (bool, optional): Whether to sort models by price. Defaults to True.
     """
     try:
         # Extract the models
         models = models_data.get('data', [])
-        
-        # Define a function to calculate total price for sorting
-        def get_total_price(model):
-            pricing = model.get('pricing', {})
-            prompt_price = float(pricing.get('prompt', 0))
-            completion_price = float(pricing.get('completion', 0))
-            return prompt_price + completion_price
-        
+
         # Sort models by total price (prompt + completion) in descending order
-        sorted_models = sorted(models, key=get_total_price, reverse=True)
-        
+        if sort_by_price:
+            models = sorted(models, key=get_total_price, reverse=True)
+
         # Create a new data structure with sorted models
         sorted_data = models_data.copy()
-        sorted_data['data'] = sorted_models
-        
+        sorted_data['data'] = models
+
         # Save the sorted data to JSON
         with open(filename, 'w') as f:
             json.dump(sorted_data, f, indent=4)
@@ -88,86 +132,101 @@ def save_models_to_json(models_data, filename="models.json"):
         return False
 
 
-def save_models_to_file(models_data, filename="models.txt"):
+# Memoized key.title() results, shared across models (keys repeat heavily)
+TITLE_CACHE = {}
+
+
+def save_models_to_file(models_data, filename="models.txt", sort_by_price=True):
     """
     Save the models data to a text file, sorted by price from priciest to cheapest.
     Includes all available information for each model.
-    
+
+    The whole document is assembled in memory and written with a single
+    f.write instead of one call per field.
+
     Args:
         models_data (dict): The models data from OpenRouter API
         filename (str, optional): The filename to save to. Defaults to "models.txt".
+        sort_by_price (bool, optional): Whether to sort models by price. Defaults to True.
     """
+    parts = []
+    append = parts.append
+
+    append("OpenRouter Available Models:\n")
+    append("Sorted by Price (priciest to cheapest):\n")
+    append("==========================\n\n")
+
+    # Extract the data array from the response
+    models = models_data.get('data', [])
+
+    # Compute each model's total price once, reused for both the sort
+    # and the display line below
+    if sort_by_price and np is not None:
+        # Vectorized sort: one C-level argsort over a float64 array
+        # instead of a Python key callable per comparison
+        prices = np.fromiter(
+            (get_total_price(model) for model in models),
+            dtype=np.float64,
+            count=len(models)
+        )
+        priced = [(float(prices[i]), models[i]) for i in np.argsort(-prices, kind='stable')]
+    else:
+        priced = [(get_total_price(model), model) for model in models]
+        if sort_by_price:
+            priced.sort(key=lambda pair: pair[0], reverse=True)
+
+    for total_price, model in priced:
+        # Display model ID and total price first for easier reference
+        append(f"Model ID: {model.get('id', 'Unknown')}\n")
+        append(f"Total Price (prompt + completion): {total_price:.10f}\n")
+
+        # Now display all available fields for the model
+        for key, value in model.items():
+            if key == 'id':
+                # Already displayed at the top
+                continue
+
+            title = TITLE_CACHE.setdefault(key, key.title())
+
+            if key == 'pricing':
+                # Pricing is displayed in a special format
+                append("Pricing:\n")
+                for price_key, price_value in value.items():
+                    append(f"  - {price_key}: {price_value}\n")
+            elif isinstance(value, dict):
+                # Handle nested dictionaries
+                append(f"{title}:\n")
+                for sub_key, sub_value in value.items():
+                    append(f"  - {sub_key}: {sub_value}\n")
+            elif isinstance(value, list):
+                # Handle lists
+                append(f"{title}:\n")
+                for item in value:
+                    if isinstance(item, dict):
+                        # If list contains dictionaries
+                        for item_key, item_value in item.items():
+                            append(f"  - {item_key}: {item_value}\n")
+                    else:
+                        append(f"  - {item}\n")
+            else:
+                # Simple key-value pairs
+                append(f"{title}: {value}\n")
+
+        append("\n")
+        append("-" * 50 + "\n\n")
+
+    # Add summary information at the end
+    append(f"Total models available: {len(models)}\n")
+    append("Data retrieved from: https://openrouter.ai/api/v1/models\n")
+    append("Models are sorted by total price (priciest to cheapest)\n")
+
+    # Include any additional metadata from the API response
+    for key, value in models_data.items():
+        if key != 'data':  # Skip the models array which we've already processed
+            append(f"\n{TITLE_CACHE.setdefault(key, key.title())}: {value}\n")
+
     with open(filename, 'w') as f:
-        f.write("OpenRouter Available Models:\n")
-        f.write("Sorted by Price (priciest to cheapest):\n")
-        f.write("==========================\n\n")
-        
-        # Extract the data array from the response
-        models = models_data.get('data', [])
-        
-        # Define a function to calculate total price for sorting
-        def get_total_price(model):
-            pricing = model.get('pricing', {})
-            prompt_price = float(pricing.get('prompt', 0))
-            completion_price = float(pricing.get('completion', 0))
-            return prompt_price + completion_price
-        
-        # Sort models by total price (prompt + completion) in descending order
-        sorted_models = sorted(models, key=get_total_price, reverse=True)
-        
-        for model in sorted_models:
-            # Calculate total price for display
-            pricing = model.get('pricing', {})
-            prompt_price = float(pricing.get('prompt', 0))
-            completion_price = float(pricing.get('completion', 0))
-            total_price = prompt_price + completion_price
-            
-            # Display model ID and total price first for easier reference
-            f.write(f"Model ID: {model.get('id', 'Unknown')}\n")
-            f.write(f"Total Price (prompt + completion): {total_price:.10f}\n")
-            
-            # Now display all available fields for the model
-            for key, value in model.items():
-                if key == 'id':
-                    # Already displayed at the top
-                    continue
-                
-                if key == 'pricing':
-                    # Pricing is displayed in a special format
-                    f.write("Pricing:\n")
-                    for price_key, price_value in value.items():
-                        f.write(f"  - {price_key}: {price_value}\n")
-                elif isinstance(value, dict):
-                    # Handle nested dictionaries
-                    f.write(f"{key.title()}:\n")
-                    for sub_key, sub_value in value.items():
-                        f.write(f"  - {sub_key}: {sub_value}\n")
-                elif isinstance(value, list):
-                    # Handle lists
-                    f.write(f"{key.title()}:\n")
-                    for item in value:
-                        if isinstance(item, dict):
-                            # If list contains dictionaries
-                            for item_key, item_value in item.items():
-                                f.write(f"  - {item_key}: {item_value}\n")
-                        else:
-                            f.write(f"  - {item}\n")
-                else:
-                    # Simple key-value pairs
-                    f.write(f"{key.title()}: {value}\n")
-            
-            f.write("\n")
-            f.write("-" * 50 + "\n\n")
-            
-        # Add summary information at the end
-        f.write(f"Total models available: {len(models)}\n")
-        f.write(f"Data retrieved from: https://openrouter.ai/api/v1/models\n")
-        f.write(f"Models are sorted by total price (priciest to cheapest)\n")
-        
-        # Include any additional metadata from the API response
-        for key, value in models_data.items():
-            if key != 'data':  # Skip the models array which we've already processed
-                f.write(f"\n{key.title()}: {value}\n")
+        f.write("".join(parts))
 
 
 def main():
@@ -1,49 +1,64 @@
 import os
+import httpx
 from dotenv import load_dotenv
 from openai import OpenAI
 
+# Load environment variables from .env file once at import time instead
+# of re-parsing it on every client construction
+load_dotenv()
+
 
 class OpenRouterClient:
     """A client for interacting with the OpenRouter API."""
-    
+
     def __init__(self, site_url=None, site_name=None):
         """
         Initialize the OpenRouter client.
-        
+
         Args:
             site_url (str, optional): Site URL for rankings on openrouter.ai
             site_name (str, optional): Site title for rankings on openrouter.ai
         """
-        # Load environment variables from .env file
-        load_dotenv()
-        
+        # Persistent connection pool with HTTP/2 multiplexing so parallel
+        # calls share a few keep-alive connections instead of opening a
+        # fresh TLS connection per request
+        self._httpx = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+            timeout=120
+        )
+
         self.client = OpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=os.environ.get("OPENROUTER_API_KEY"),
+            http_client=self._httpx,
         )
-        
+
         # self.extra_headers = {
         #     "HTTP-Referer": site_url or "<YOUR_SITE_URL>",
         #     "X-Title": site_name or "<YOUR_SITE_NAME>",
         # }
     
-    def generate_completion(self, messages, model="openai/gpt-4o"):
+    def generate_completion(self, messages, model="openai/gpt-4o", extra_body=None):
         """
         Generate a completion using the OpenRouter API.
-        
+
         Args:
             messages (list): List of message dictionaries
             model (str, optional): Model to use for completion
-            
+            extra_body (dict, optional): Extra OpenRouter request fields,
+                e.g. {"provider": {"sort": "throughput"}}
+
         Returns:
             str: The generated completion text
         """
         completion = self.client.chat.completions.create(
             #extra_headers=self.extra_headers,
             model=model,
-            messages=messages
+            messages=messages,
+            extra_body=extra_body
         )
-        
+
         return completion
     
     def generate_answer(self, messages, model="openai/gpt-4o"):
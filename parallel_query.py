@@ -3,20 +3,68 @@
 Script to call multiple LLM models in parallel via OpenRouter API and compare their outputs.
 Models are loaded from the models list provided by the user.
 """
-import json
+import asyncio
+import gzip
+import hashlib
+import os
+import random
+import sys
+import tempfile
 import time
-import concurrent.futures
-from rich.console import Console
+import httpx
+import orjson
+from pathlib import Path
+from rich.console import Console, Group
+from rich.live import Live
 from rich.panel import Panel
 from rich.table import Table
-from datetime import datetime
+from dotenv import load_dotenv
+from functools import partial
 from openrouter import OpenRouterClient
 
+try:
+    from aiomultiprocess import Pool
+except ImportError:
+    # Optional: only needed once MODELS grows past MULTIPROCESS_THRESHOLD
+    Pool = None
+
+# Load environment variables from .env file once at import time
+load_dotenv()
+
 # Initialize rich console for nicer output
 console = Console()
 
-# List of models to query
-MODELS = [
+# OpenRouter chat completions endpoint
+API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Transient HTTP statuses worth retrying with backoff
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 3
+
+# Wall-clock budget per model; a hung provider no longer stalls the run
+PER_MODEL_TIMEOUT = 90
+
+# Above this many models, shard the fan-out across one event loop per
+# CPU core so TLS/JSON decode work escapes the GIL
+MULTIPROCESS_THRESHOLD = 64
+
+# Response cache keyed on (model, prompt hash): re-running the same
+# prompt costs zero API calls within the TTL
+RESPONSE_CACHE_DIR = Path.home() / ".cache" / "talk-to-all-llms"
+RESPONSE_CACHE_TTL = 24 * 3600  # 1 day
+
+# In-memory layer on top of the disk cache, for the current session
+_response_cache = {}
+
+# Full responses go to responses/<model>.md; panels only render this
+# many characters so thinking models can't drown the terminal
+PREVIEW_CHARS = 2000
+
+# How often to poll an offline batch job for completion
+BATCH_POLL_INTERVAL = 60
+
+# List of models to query (deduplicated, declaration order preserved)
+MODELS = tuple(dict.fromkeys([
     "anthropic/claude-3-7-sonnet-thinking",
     "openai/o3-mini-2025-01-31-high",
     "openai/o1-2024-12-17-high",
@@ -51,44 +99,248 @@ MODELS = [
     "alibaba/qwen2.5-72b-instruct-turbo",
     "meta/llama-3.3-70b-instruct-turbo",
     "google/gemma-3-27b-it"
-]
+]))
+
+# For O(1) membership tests when extending or filtering the model list
+MODELS_SET = frozenset(MODELS)
 
-def query_model(model_id, prompt, client):
+def response_cache_key(model_id, prompt):
     """
-    Query a specific model through OpenRouter API.
-    
+    Build the cache key for a (model, prompt) pair.
+
+    Args:
+        model_id (str): The ID of the model
+        prompt (str): The prompt text
+
+    Returns:
+        str: A filesystem-safe cache key
+    """
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    return f"{model_id.replace('/', '_')}-{prompt_hash}"
+
+def load_cached_response(model_id, prompt):
+    """
+    Look up a previous result for this (model, prompt) pair.
+
+    Checks the in-memory cache first, then the disk cache (subject to
+    the TTL on the file's mtime).
+
+    Args:
+        model_id (str): The ID of the model
+        prompt (str): The prompt text
+
+    Returns:
+        dict or None: The cached result dict, or None on a miss
+    """
+    key = response_cache_key(model_id, prompt)
+
+    if key in _response_cache:
+        return _response_cache[key]
+
+    cache_file = RESPONSE_CACHE_DIR / f"{key}.json"
+    try:
+        if time.time() - cache_file.stat().st_mtime < RESPONSE_CACHE_TTL:
+            result = orjson.loads(cache_file.read_bytes())
+            _response_cache[key] = result
+            return result
+    except (OSError, orjson.JSONDecodeError):
+        # Missing or corrupt cache entry: treat as a miss
+        pass
+
+    return None
+
+def store_cached_response(model_id, prompt, result):
+    """
+    Persist a successful result for this (model, prompt) pair.
+
+    Args:
+        model_id (str): The ID of the model
+        prompt (str): The prompt text
+        result (dict): The result dict to cache
+    """
+    key = response_cache_key(model_id, prompt)
+    _response_cache[key] = result
+
+    try:
+        RESPONSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cache_file = RESPONSE_CACHE_DIR / f"{key}.json"
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        tmp_file.write_bytes(orjson.dumps(result))
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # Caching is best-effort; never fail the query over it
+        pass
+
+def build_messages(model_id, prompt):
+    """
+    Build the messages payload for a model.
+
+    For Anthropic models, the prompt is marked with a cache_control
+    breakpoint so repeated runs with the same prompt hit the provider's
+    prompt cache (~10% of normal input-token price) instead of re-paying
+    full cost. Other providers get the plain string form.
+
+    Args:
+        model_id (str): The ID of the model to query
+        prompt (str): The prompt to send to the model
+
+    Returns:
+        list: A list of message dictionaries
+    """
+    if model_id.startswith("anthropic/"):
+        return [{
+            "role": "user",
+            "content": [{
+                "type": "text",
+                "text": prompt,
+                "cache_control": {"type": "ephemeral"}
+            }]
+        }]
+    return [{"role": "user", "content": prompt}]
+
+def build_base_body(prompt):
+    """
+    Build the request fields shared by every model in a fan-out.
+
+    Constructed once per run and shallow-copied per request, so the 34
+    workers share one messages list instead of allocating their own.
+    Sharing is safe because no worker mutates it.
+
     Args:
+        prompt (str): The prompt to send to all models
+
+    Returns:
+        dict: The common request body, minus the per-request "model" key
+    """
+    return {
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        # Route to the fastest available upstream provider
+        "provider": {"sort": "throughput"}
+    }
+
+async def query_model_async(client, model_id, prompt, base_body, headers, progress):
+    """
+    Query a specific model through OpenRouter API, streaming the response.
+
+    The partial response text is published into `progress` as chunks
+    arrive so the live display can render it incrementally.
+
+    Args:
+        client (httpx.AsyncClient): The shared HTTP client
         model_id (str): The ID of the model to query
         prompt (str): The prompt to send to the model
-        client (OpenRouterClient): The OpenRouter client instance
-        
+        base_body (dict): Request fields shared across the fan-out
+        headers (dict): Request headers including the API key
+        progress (dict): Shared model_id -> partial response text mapping
+
     Returns:
         dict: The response from the model with relevant metadata
     """
-    messages = [{"role": "user", "content": prompt}]
-    
+    # Serve identical repeated queries from the local response cache
+    cached = load_cached_response(model_id, prompt)
+    if cached is not None:
+        progress[model_id] = cached["response"]
+        return cached
+
+    body = {**base_body, "model": model_id}
+    if model_id.startswith("anthropic/"):
+        # Anthropic prompts use the structured cacheable form
+        body["messages"] = build_messages(model_id, prompt)
+
     start_time = time.time()
-    
+
     try:
-        completion = client.generate_completion(messages, model=model_id)
-        
+        # Retry transient failures (429/5xx, connection errors) with
+        # exponential backoff and jitter instead of losing the answer
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                response_text = ""
+                model_name = model_id
+                finish_reason = "unknown"
+                usage = {}
+                stream_done = False
+
+                async with client.stream(
+                    "POST",
+                    API_URL,
+                    json=body,
+                    headers=headers,
+                    timeout=120
+                ) as response:
+                    response.raise_for_status()
+
+                    # Parse the SSE stream, accumulating delta content.
+                    # No lock needed: the loop is single-threaded and there
+                    # is no await between reading and writing `progress`.
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data: "):
+                            continue
+                        payload = line[len("data: "):]
+                        if payload == "[DONE]":
+                            stream_done = True
+                            break
+                        chunk = orjson.loads(payload)
+                        if chunk.get("error"):
+                            # Mid-stream provider failures arrive as an
+                            # error chunk on an HTTP 200 stream; raise so
+                            # they hit the error path instead of passing
+                            # as an empty success
+                            error = chunk["error"]
+                            raise RuntimeError(
+                                f"Provider error: {error.get('message', error)}"
+                            )
+                        model_name = chunk.get("model", model_name)
+                        if chunk.get("usage"):
+                            usage = chunk["usage"]
+                        for choice in chunk.get("choices", []):
+                            delta = choice.get("delta", {}).get("content")
+                            if delta:
+                                response_text += delta
+                                progress[model_id] = response_text
+                            if choice.get("finish_reason"):
+                                finish_reason = choice["finish_reason"]
+
+                    # A clean connection close before [DONE] means the
+                    # response is incomplete; say so instead of passing
+                    # the partial text off as a finished completion
+                    if not stream_done and finish_reason == "unknown":
+                        finish_reason = "truncated"
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                transient = (
+                    isinstance(e, httpx.TransportError)
+                    or e.response.status_code in RETRY_STATUS_CODES
+                )
+                if not transient or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                progress[model_id] = ""
+                await asyncio.sleep((2 ** attempt) + random.random())
+
         elapsed_time = time.time() - start_time
-        
-        # Extract completion text and add timing information
-        return {
+
+        # Return the accumulated text with timing information
+        result = {
             "model_id": model_id,
-            "model_name": completion.model,
-            "response": completion.choices[0].message.content,
+            "model_name": model_name,
+            "response": response_text,
             "elapsed_time": elapsed_time,
-            "finish_reason": completion.choices[0].finish_reason,
+            "finish_reason": finish_reason,
             "tokens": {
-                "prompt": completion.usage.prompt_tokens,
-                "completion": completion.usage.completion_tokens,
-                "total": completion.usage.total_tokens
+                "prompt": usage.get("prompt_tokens", 0),
+                "completion": usage.get("completion_tokens", 0),
+                "total": usage.get("total_tokens", 0)
             }
         }
+        # Only cache real completions: an empty or truncated result
+        # would otherwise be served as this model's answer for a day
+        if result["response"] and result["finish_reason"] in ("stop", "length"):
+            store_cached_response(model_id, prompt, result)
+        return result
     except Exception as e:
         console.print(f"[bold red]Error querying {model_id}:[/bold red] {str(e)}")
+        progress[model_id] = f"Error: {str(e)}"
         return {
             "model_id": model_id,
             "model_name": model_id,
@@ -98,34 +350,269 @@ def query_model(model_id, prompt, client):
             "tokens": {"prompt": 0, "completion": 0, "total": 0}
         }
 
-def query_models_in_parallel(prompt):
+async def query_model_with_timeout(client, model_id, prompt, base_body, headers, progress):
+    """
+    Run query_model_async under a per-model timeout.
+
+    On timeout, returns a placeholder result (finish_reason="timeout")
+    carrying whatever partial text had streamed in, so one slow model
+    bounds its own cost instead of stalling the whole comparison.
+
+    Args:
+        client (httpx.AsyncClient): The shared HTTP client
+        model_id (str): The ID of the model to query
+        prompt (str): The prompt to send to the model
+        base_body (dict): Request fields shared across the fan-out
+        headers (dict): Request headers including the API key
+        progress (dict): Shared model_id -> partial response text mapping
+
+    Returns:
+        dict: The response from the model with relevant metadata
+    """
+    try:
+        return await asyncio.wait_for(
+            query_model_async(client, model_id, prompt, base_body, headers, progress),
+            timeout=PER_MODEL_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        console.print(
+            f"[bold red]Timed out waiting for {model_id} "
+            f"after {PER_MODEL_TIMEOUT}s[/bold red]"
+        )
+        return {
+            "model_id": model_id,
+            "model_name": model_id,
+            "response": progress.get(model_id) or f"Error: timed out after {PER_MODEL_TIMEOUT}s",
+            "elapsed_time": float(PER_MODEL_TIMEOUT),
+            "finish_reason": "timeout",
+            "tokens": {"prompt": 0, "completion": 0, "total": 0}
+        }
+
+# Lazily-created client for the multiprocess fan-out path: one per
+# worker process, shared by every model that worker handles (clients
+# can't be pickled across process boundaries)
+_worker_client = None
+
+def get_worker_client():
+    """
+    Return this worker process's shared httpx client, creating it on
+    first use.
+
+    Returns:
+        httpx.AsyncClient: The per-process HTTP client
+    """
+    global _worker_client
+    if _worker_client is None:
+        _worker_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64)
+        )
+    return _worker_client
+
+async def query_model_solo(model_id, prompt):
+    """
+    Worker coroutine for the multiprocess fan-out path.
+
+    Reuses the worker process's shared httpx client so each worker pays
+    for its connection pool once, not once per model, and queries a
+    single model without the shared live-display state. The client is
+    left open; it dies with the worker process.
+
+    Args:
+        model_id (str): The ID of the model to query
+        prompt (str): The prompt to send to the model
+
+    Returns:
+        dict: The response from the model with relevant metadata
+    """
+    headers = {
+        "Authorization": f"Bearer {os.environ.get('OPENROUTER_API_KEY')}",
+        "Content-Type": "application/json"
+    }
+
+    return await query_model_with_timeout(
+        get_worker_client(), model_id, prompt, build_base_body(prompt), headers, {}
+    )
+
+def render_progress(progress):
+    """
+    Build the live view: one panel per model with its partial response.
+
+    Args:
+        progress (dict): Shared model_id -> partial response text mapping
+
+    Returns:
+        Group: A renderable group of per-model panels
+    """
+    return Group(*(
+        Panel(text or "[dim]waiting...[/dim]", title=model_id, border_style="yellow")
+        for model_id, text in progress.items()
+    ))
+
+async def query_models_in_parallel(prompt):
     """
     Query multiple models in parallel and return their responses.
-    
+
     Args:
         prompt (str): The prompt to send to all models
-        
+
+    Returns:
+        list: A list of response dictionaries from each model
+    """
+    # Fail fast on a missing key instead of fanning out N doomed requests
+    api_key = os.environ.get("OPENROUTER_API_KEY")
+    if not api_key:
+        raise ValueError("OPENROUTER_API_KEY environment variable not found")
+
+    # For very large model lists, shard across one event loop per CPU
+    # core; a single loop's TLS/JSON decode CPU becomes the bottleneck
+    # at hundreds of concurrent requests
+    if Pool is not None and len(MODELS) >= MULTIPROCESS_THRESHOLD:
+        async with Pool(processes=os.cpu_count()) as pool:
+            return await pool.map(partial(query_model_solo, prompt=prompt), MODELS)
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    # Request fields shared by every model, built once for the fan-out
+    base_body = build_base_body(prompt)
+
+    # Shared partial-response state for the live display
+    progress = {model_id: "" for model_id in MODELS}
+
+    # Fan out over a single event loop with a shared connection pool,
+    # rendering each model's panel incrementally as chunks arrive
+    async with httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=64)
+    ) as client:
+        tasks = [
+            asyncio.create_task(
+                query_model_with_timeout(client, model_id, prompt, base_body, headers, progress)
+            )
+            for model_id in MODELS
+        ]
+
+        with Live(
+            render_progress(progress),
+            console=console,
+            refresh_per_second=8,
+            vertical_overflow="crop",
+            transient=True
+        ) as live:
+            while not all(task.done() for task in tasks):
+                await asyncio.sleep(0.125)
+                live.update(render_progress(progress))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Convert any stray exceptions into the standard error result shape
+    return [
+        result if isinstance(result, dict) else {
+            "model_id": model_id,
+            "model_name": model_id,
+            "response": f"Error: {str(result)}",
+            "elapsed_time": 0,
+            "finish_reason": "error",
+            "tokens": {"prompt": 0, "completion": 0, "total": 0}
+        }
+        for model_id, result in zip(MODELS, results)
+    ]
+
+def submit_batch(models, prompt):
+    """
+    Submit all model queries as a single offline batch job.
+
+    Batch requests get ~50% pricing and higher rate limits in exchange
+    for up to 24-hour turnaround, which suits evaluation runs where
+    nobody is watching the terminal. Blocks while polling the job, then
+    returns results in the same shape the live path produces.
+
+    Args:
+        models (tuple): Model IDs to query
+        prompt (str): The prompt to send to all models
+
     Returns:
         list: A list of response dictionaries from each model
     """
-    # Create the OpenRouter client
     client = OpenRouterClient(
         site_url="https://talk-to-all-llms-at-once",
         site_name="LLM Comparison Tool"
+    ).client
+
+    # One JSONL line per model, tagged so output lines can be matched back
+    lines = [
+        orjson.dumps({
+            "custom_id": f"{i}-{model_id}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": model_id, "messages": build_messages(model_id, prompt)}
+        })
+        for i, model_id in enumerate(models)
+    ]
+
+    with tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False) as f:
+        f.write(b"\n".join(lines) + b"\n")
+        input_path = f.name
+
+    try:
+        with open(input_path, "rb") as f:
+            input_file = client.files.create(file=f, purpose="batch")
+    finally:
+        os.unlink(input_path)
+
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
     )
-    
-    # Use ThreadPoolExecutor to query models in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(MODELS)) as executor:
-        # Start the query operations and mark each future with its model
-        future_to_model = {
-            executor.submit(query_model, model_id, prompt, client): model_id
-            for model_id in MODELS
-        }
-        
-        results = []
-        for future in concurrent.futures.as_completed(future_to_model):
-            results.append(future.result())
-            
+    console.print(f"[bold yellow]Submitted batch {batch.id}; polling every {BATCH_POLL_INTERVAL}s...[/bold yellow]")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch = client.batches.retrieve(batch.id)
+        console.print(f"[dim]Batch {batch.id}: {batch.status}[/dim]")
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} finished with status: {batch.status}")
+
+    # Parse the output JSONL into the result shape display_results expects
+    results = []
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        entry = orjson.loads(line)
+        model_id = entry["custom_id"].split("-", 1)[1]
+        body = (entry.get("response") or {}).get("body") or {}
+        choices = body.get("choices", [])
+        usage = body.get("usage", {})
+
+        if choices:
+            results.append({
+                "model_id": model_id,
+                "model_name": body.get("model", model_id),
+                "response": choices[0]["message"]["content"],
+                "elapsed_time": 0.0,
+                "finish_reason": choices[0].get("finish_reason", "unknown"),
+                "tokens": {
+                    "prompt": usage.get("prompt_tokens", 0),
+                    "completion": usage.get("completion_tokens", 0),
+                    "total": usage.get("total_tokens", 0)
+                }
+            })
+        else:
+            error = entry.get("error") or {}
+            results.append({
+                "model_id": model_id,
+                "model_name": model_id,
+                "response": f"Error: {error.get('message', 'no output returned')}",
+                "elapsed_time": 0.0,
+                "finish_reason": "error",
+                "tokens": {"prompt": 0, "completion": 0, "total": 0}
+            })
+
     return results
 
 def display_results(results, prompt):
@@ -164,25 +651,47 @@ def display_results(results, prompt):
     console.print(metrics_table)
     console.print("\n")
     
-    # Display each model's response in a panel
+    # Write each full response to a file and display a bounded preview;
+    # long thinking-model outputs are grepped from disk, not scrolled
+    responses_dir = Path("responses")
+    responses_dir.mkdir(exist_ok=True)
+
     for result in results:
+        # Key files on model_id: the API-reported model_name can repeat
+        # across MODELS entries (e.g. o3-mini high/medium/low), and the
+        # dedup guarantees model_id is unique
+        response_file = responses_dir / f"{result['model_id'].replace('/', '_')}.md"
+        response_file.write_text(result["response"])
+
+        preview = result["response"][:PREVIEW_CHARS]
+        if len(result["response"]) > PREVIEW_CHARS:
+            preview += f"\n\n[dim]… truncated, full response in {response_file}[/dim]"
+
         console.print(Panel(
-            result["response"],
+            preview,
             title=f"{result['model_name']} ({result['elapsed_time']:.2f}s)",
+            subtitle=str(response_file),
             border_style="green"
         ))
         console.print("\n")
     
-    # Save results to a file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"comparison_results_{timestamp}.json"
-    
-    with open(filename, 'w') as f:
-        json.dump({
-            "prompt": prompt,
-            "timestamp": timestamp,
-            "results": results
-        }, f, indent=2)
+    # Save results to a gzip-compressed file (timestamp computed once
+    # and reused below); multi-MB JSON from long generations compresses
+    # 5-10x. Each result is serialized separately so peak memory during
+    # the write is bounded by the largest single response, not the
+    # whole document
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    filename = f"comparison_results_{timestamp}.json.gz"
+
+    with gzip.open(filename, 'wb') as f:
+        f.write(b'{"prompt":' + orjson.dumps(prompt))
+        f.write(b',"timestamp":' + orjson.dumps(timestamp))
+        f.write(b',"results":[')
+        for i, result in enumerate(results):
+            if i:
+                f.write(b",")
+            f.write(orjson.dumps(result))
+        f.write(b"]}")
     
     console.print(f"[bold green]Results saved to:[/bold green] {filename}")
 
@@ -198,10 +707,14 @@ def main():
         console.print("[bold red]Prompt cannot be empty. Exiting.[/bold red]")
         return
     
-    console.print(f"\n[bold yellow]Querying {len(MODELS)} models in parallel...[/bold yellow]")
-    
     try:
-        results = query_models_in_parallel(prompt)
+        # With --batch, trade 24-hour turnaround for 50% pricing
+        if "--batch" in sys.argv:
+            console.print(f"\n[bold yellow]Submitting {len(MODELS)} models as an offline batch...[/bold yellow]")
+            results = submit_batch(MODELS, prompt)
+        else:
+            console.print(f"\n[bold yellow]Querying {len(MODELS)} models in parallel...[/bold yellow]")
+            results = asyncio.run(query_models_in_parallel(prompt))
         display_results(results, prompt)
     except Exception as e:
         console.print(f"[bold red]An error occurred:[/bold red] {str(e)}")
@@ -3,50 +3,118 @@
 Script to call multiple LLM models in parallel via OpenRouter API and compare their outputs.
 Models: Claude 3.7 Sonnet, Gemini 2 Pro, and O1
 """
-import json
+import asyncio
+import os
+import random
 import time
-import concurrent.futures
+import httpx
+import orjson
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
-from datetime import datetime
-from openrouter import OpenRouterClient
+from dotenv import load_dotenv
+
+# Load environment variables from .env file once at import time
+load_dotenv()
 
 # Initialize rich console for nicer output
 console = Console()
 
-def query_model(model_id, prompt, client):
+# OpenRouter chat completions endpoint
+API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Transient HTTP statuses worth retrying with backoff
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 3
+
+def build_messages(model_id, prompt):
+    """
+    Build the messages payload for a model.
+
+    For Anthropic models, the prompt is marked with a cache_control
+    breakpoint so repeated runs with the same prompt hit the provider's
+    prompt cache instead of re-paying full input-token cost. Other
+    providers get the plain string form.
+
+    Args:
+        model_id (str): The ID of the model to query
+        prompt (str): The prompt to send to the model
+
+    Returns:
+        list: A list of message dictionaries
+    """
+    if model_id.startswith("anthropic/"):
+        return [{
+            "role": "user",
+            "content": [{
+                "type": "text",
+                "text": prompt,
+                "cache_control": {"type": "ephemeral"}
+            }]
+        }]
+    return [{"role": "user", "content": prompt}]
+
+async def query_model_async(client, model_id, prompt, headers):
     """
     Query a specific model through OpenRouter API.
-    
+
     Args:
+        client (httpx.AsyncClient): The shared HTTP client
         model_id (str): The ID of the model to query
         prompt (str): The prompt to send to the model
-        client (OpenRouterClient): The OpenRouter client instance
-        
+        headers (dict): Request headers including the API key
+
     Returns:
         dict: The response from the model with relevant metadata
     """
-    messages = [{"role": "user", "content": prompt}]
-    
+    messages = build_messages(model_id, prompt)
+
     start_time = time.time()
-    
+
     try:
-        completion = client.generate_completion(messages, model=model_id)
-        
+        # Retry transient failures (429/5xx, connection errors) with
+        # exponential backoff and jitter instead of losing the answer
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                response = await client.post(
+                    API_URL,
+                    json={
+                        "model": model_id,
+                        "messages": messages,
+                        # Route to the fastest available upstream provider
+                        "provider": {"sort": "throughput"}
+                    },
+                    headers=headers,
+                    timeout=120
+                )
+                response.raise_for_status()
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                transient = (
+                    isinstance(e, httpx.TransportError)
+                    or e.response.status_code in RETRY_STATUS_CODES
+                )
+                if not transient or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep((2 ** attempt) + random.random())
+
+        data = orjson.loads(response.content)
+
         elapsed_time = time.time() - start_time
-        
+
+        usage = data.get("usage", {})
+
         # Extract completion text and add timing information
         return {
             "model_id": model_id,
-            "model_name": completion.model,
-            "response": completion.choices[0].message.content,
+            "model_name": data.get("model", model_id),
+            "response": data["choices"][0]["message"]["content"],
             "elapsed_time": elapsed_time,
-            "finish_reason": completion.choices[0].finish_reason,
+            "finish_reason": data["choices"][0].get("finish_reason", "unknown"),
             "tokens": {
-                "prompt": completion.usage.prompt_tokens,
-                "completion": completion.usage.completion_tokens,
-                "total": completion.usage.total_tokens
+                "prompt": usage.get("prompt_tokens", 0),
+                "completion": usage.get("completion_tokens", 0),
+                "total": usage.get("total_tokens", 0)
             }
         }
     except Exception as e:
@@ -60,13 +128,13 @@ def query_model(model_id, prompt, client):
             "tokens": {"prompt": 0, "completion": 0, "total": 0}
         }
 
-def query_models_in_parallel(prompt):
+async def query_models_in_parallel(prompt):
     """
     Query multiple models in parallel and return their responses.
-    
+
     Args:
         prompt (str): The prompt to send to all models
-        
+
     Returns:
         list: A list of response dictionaries from each model
     """
@@ -76,25 +144,39 @@ def query_models_in_parallel(prompt):
         "google/gemini-pro-1.5",
         "openai/o1"
     ]
-    
-    # Create the OpenRouter client
-    client = OpenRouterClient(
-        site_url="https://talk-to-all-llms-at-once",
-        site_name="LLM Comparison Tool"
-    )
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(models)) as executor:
-        # Start the query operations and mark each future with its model
-        future_to_model = {
-            executor.submit(query_model, model_id, prompt, client): model_id
-            for model_id in models
+
+    # Fail fast on a missing key instead of fanning out doomed requests
+    api_key = os.environ.get("OPENROUTER_API_KEY")
+    if not api_key:
+        raise ValueError("OPENROUTER_API_KEY environment variable not found")
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    # Fan out over a single event loop with a shared connection pool
+    async with httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=64)
+    ) as client:
+        results = await asyncio.gather(
+            *(query_model_async(client, model_id, prompt, headers) for model_id in models),
+            return_exceptions=True
+        )
+
+    # Convert any stray exceptions into the standard error result shape
+    return [
+        result if isinstance(result, dict) else {
+            "model_id": model_id,
+            "model_name": model_id,
+            "response": f"Error: {str(result)}",
+            "elapsed_time": 0,
+            "finish_reason": "error",
+            "tokens": {"prompt": 0, "completion": 0, "total": 0}
         }
-        
-        results = []
-        for future in concurrent.futures.as_completed(future_to_model):
-            results.append(future.result())
-            
-    return results
+        for model_id, result in zip(models, results)
+    ]
 
 def display_results(results, prompt):
     """
@@ -141,16 +223,16 @@ def display_results(results, prompt):
         ))
         console.print("\n")
     
-    # Save results to a file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Save results to a file (timestamp computed once and reused below)
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
     filename = f"comparison_results_{timestamp}.json"
     
-    with open(filename, 'w') as f:
-        json.dump({
+    with open(filename, 'wb') as f:
+        f.write(orjson.dumps({
             "prompt": prompt,
             "timestamp": timestamp,
             "results": results
-        }, f, indent=2)
+        }, option=orjson.OPT_INDENT_2))
     
     console.print(f"[bold green]Results saved to:[/bold green] {filename}")
 
@@ -169,7 +251,7 @@ def main():
     console.print("\n[bold yellow]Querying models in parallel...[/bold yellow]")
     
     try:
-        results = query_models_in_parallel(prompt)
+        results = asyncio.run(query_models_in_parallel(prompt))
         display_results(results, prompt)
     except Exception as e:
         console.print(f"[bold red]An error occurred:[/bold red] {str(e)}")